@@ -4,6 +4,7 @@ import base64
 import time
 import argparse
 import threading
+import queue
 import os
 import sys
 import socket
@@ -13,6 +14,7 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, simpledialog, filedialog
 import sqlite3
 import uuid
+from collections import deque
 from PIL import Image, ImageTk  # Add this import for system tray icon
 import traceback
 import select  # Add for non-blocking socket
@@ -53,6 +55,86 @@ except ImportError:
     AWS_IOT_AVAILABLE = False
     print("Warning: AWS IoT SDK not found. Install with 'pip install awsiotsdk' for IoT connectivity.")
 
+# Optional faster JSON parser (falls back to the standard library)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data) # stdlib accepts bytes directly (Python 3.6+)
+
+def json_dumps(obj, indent=False):
+    """Serialize obj to a JSON string, using orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode('utf-8')
+    # Same layout as orjson: 2-space indent, compact separators, raw UTF-8
+    return json.dumps(obj, indent=2 if indent else None, separators=None if indent else (",", ":"), ensure_ascii=False)
+
+def json_dumpb(obj, indent=False):
+    """Serialize obj to UTF-8 encoded JSON bytes, for writing files in binary mode"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json_dumps(obj, indent).encode('utf-8')
+
+def sequential_opener(path, flags):
+    """open() opener that hints sequential access where the OS supports it (Windows)"""
+    return os.open(path, flags | getattr(os, 'O_SEQUENTIAL', 0))
+
+def file_timestamp():
+    """Current local time as YYYYmmdd_HHMMSS, used in default export filenames"""
+    now = datetime.now()
+    return f"{now.year:04d}{now.month:02d}{now.day:02d}_{now.hour:02d}{now.minute:02d}{now.second:02d}"
+
+# --- Alarm History Records ---
+# In-memory alarms carry cached helper fields whose keys start with "_"; they are never saved.
+def format_alarm_timestamp(timestamp_str):
+    """Format an ISO timestamp for display (naive values are taken as local time)
+
+    Raises ValueError if the string is not ISO 8601.
+    """
+    # Handle timezone 'Z' and offsets for display
+    dt_str = timestamp_str
+    if dt_str.endswith('Z'):
+        dt_str = dt_str[:-1] + '+00:00'
+    if '+' in dt_str or '-' in dt_str[10:]: # Check for offset info
+        dt = datetime.fromisoformat(dt_str)
+    else: # Assume naive timestamp is local
+        dt = datetime.fromisoformat(dt_str).astimezone()
+    return dt.strftime("%Y-%m-%d %H:%M:%S %Z") # Display timezone
+
+def index_alarm(alarm):
+    """Attach the cached search text and display time used by the history view (in place)"""
+    if isinstance(alarm, dict):
+        # Fields are joined with the ASCII unit separator so a search can't match across two fields
+        alarm["_search"] = (f"{alarm.get('timestamp','')}\x1f{alarm.get('room_number','')}\x1f"
+                            f"{alarm.get('beacon_mac','')}\x1f{alarm.get('description','')}").lower()
+        timestamp = alarm.get('timestamp', '')
+        try:
+            alarm["_display_ts"] = format_alarm_timestamp(timestamp) if timestamp else "Unknown Time"
+        except ValueError:
+            alarm["_display_ts"] = timestamp # Show the raw value if it can't be parsed
+        except Exception as e:
+            alarm["_display_ts"] = f"Time Error: {e}"
+    return alarm
+
+def alarm_sort_key(alarm):
+    """History order key: the ISO timestamp string (entries without one sort oldest)
+
+    Always returns a str, so a null or non-string timestamp in the file can't break sorting.
+    """
+    return str(alarm.get('timestamp') or '0') if isinstance(alarm, dict) else '0'
+
+def alarm_record(alarm):
+    """Return the alarm as it is saved/exported, without the in-memory helper fields"""
+    if isinstance(alarm, dict):
+        return {key: value for key, value in alarm.items() if not key.startswith("_")}
+    return alarm
+
 # --- Constants ---
 APP_TITLE = "Beacon Alert and Management System"
 APP_VERSION = "2.0" # Combined version
@@ -68,11 +150,22 @@ DEFAULT_CERT_DIR = os.path.join(os.path.expanduser("~"), "Desktop", "MikeTheMexi
 DEFAULT_CLIENT_ID = "hotel-beacon-client"
 DEFAULT_TOPIC = "#"
 DEFAULT_ALERT_TOPIC = "beacon/alerts" # From client.py
+# awscrt reconnects on its own and resumes the same persistent session; these bound its backoff
+AWS_RECONNECT_MIN_SECS = 1
+AWS_RECONNECT_MAX_SECS = 30
+# Only if the SDK still hasn't resumed after this long is the connection rebuilt by hand (same client ID)
+AWS_MANUAL_RECONNECT_SECS = 300
 
 # Config directories and files (Consolidated)
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), "AppData", "Local", "HotelBeacons", "config")
 SETTINGS_FILE = os.path.join(CONFIG_DIR, "settings.json") # Using admin.py's settings file
-ALARM_HISTORY_FILE = os.path.join(CONFIG_DIR, "alarm_history.json") # Using client.py's history file
+ALARM_HISTORY_FILE = os.path.join(CONFIG_DIR, "alarm_history.jsonl") # One JSON record per line (append-only)
+LEGACY_ALARM_HISTORY_FILE = os.path.join(CONFIG_DIR, "alarm_history.json") # Old single-document format, migrated on load
+MAX_ALARM_HISTORY = 10000 # Oldest alarms are dropped beyond this many entries
+HISTORY_ENTRY_SEPARATOR = "-" * 60 + "\n\n" # Rule drawn after each history entry
+HISTORY_PAGE_SIZE = 200 # Matching alarms rendered per history page ("Show More" adds another)
+SEARCH_DEBOUNCE_MS = 150 # Quiet time after the last search keystroke before redrawing
+HISTORY_REFRESH_MS = 200 # Window for coalescing a burst of new alarms into one redraw
 
 # Ensure config directory exists
 if not os.path.exists(CONFIG_DIR):
@@ -93,8 +186,23 @@ DEFAULT_SETTINGS = {
     "port": 8883,
     "scan_interval": 5,
     "room_mapping_file": "", # Added placeholder for room mapping file path if needed from config
+    "debug_raw_hex": False, # Include the raw payload hex in decoded messages (diagnostics only)
+    "alert_blink_ms": 500, # Alarm popup blink period in milliseconds
 }
 
+# Admin settings form rows for the AWS tab: (label, settings key, has "Browse..." button)
+AWS_SETTINGS_FIELDS = (
+    ("Endpoint:", "aws_endpoint", False),
+    ("Certificate File:", "cert_file", True),
+    ("Key File:", "key_file", True),
+    ("Root CA File:", "root_ca", True),
+    ("Client ID:", "client_id", False),
+    ("Subscribe Topic:", "topic", False),
+    ("Alert Topic:", "alert_topic", False),
+)
+
+MIN_ALERT_BLINK_MS = 250 # Floor for the alarm blink period so a bad setting can't flood the Tk event loop
+
 # --- Beacon Database Class (from admin.py) ---
 class BeaconDatabase:
     """Database manager for storing beacon information"""
@@ -368,6 +476,10 @@ class BeaconDatabase:
             import_count = 0
             update_count = 0
 
+            # Fetch existing MACs once instead of querying per imported row
+            self.cursor.execute("SELECT mac_address FROM beacons")
+            existing_macs = {row[0] for row in self.cursor.fetchall()}
+
             for beacon in mapping_data.get("beacons", []):
                 mac_address = beacon.get("mac_address") or beacon.get("mac") # Handle both keys
                 room_number = beacon.get("room_number")
@@ -377,10 +489,7 @@ class BeaconDatabase:
                     print(f"Skipping invalid beacon entry: {beacon}")
                     continue
 
-                # Check if beacon already exists
-                existing = self.get_beacon_by_mac(mac_address)
-
-                if existing:
+                if mac_address in existing_macs:
                     # Update existing beacon
                     self.cursor.execute(
                         "UPDATE beacons SET room_number = ?, description = ? WHERE mac_address = ?",
@@ -394,6 +503,7 @@ class BeaconDatabase:
                         "INSERT INTO beacons (mac_address, room_number, description, created_at) VALUES (?, ?, ?, ?)",
                         (mac_address, room_number, description, current_time)
                     )
+                    existing_macs.add(mac_address) # Later duplicates in the file update this row
                     import_count += 1
 
             # Commit the transaction
@@ -444,8 +554,8 @@ class SettingsManager:
         """Load settings from file"""
         if os.path.exists(self.settings_file):
             try:
-                with open(self.settings_file, 'r', encoding='utf-8') as f:
-                    loaded_settings = json.load(f)
+                with open(self.settings_file, 'rb') as f:
+                    loaded_settings = json_loads(f.read())
                     # Update settings with loaded values, maintaining defaults for missing keys
                     temp_settings = DEFAULT_SETTINGS.copy()
                     temp_settings.update(loaded_settings)
@@ -467,7 +577,7 @@ class SettingsManager:
             # Ensure the config directory exists before saving
             os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
             with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, indent=4)
+                f.write(json_dumps(self.settings, indent=True))
             return True
         except Exception as e:
             print(f"Error saving settings: {e}")
@@ -484,6 +594,20 @@ class SettingsManager:
         self.settings[key] = value
         self.save_settings() # Auto-save on set
 
+    def update(self, values):
+        """Set several setting values and save the file once"""
+        self.settings.update(values)
+        return self.save_settings()
+
+# --- LW004-PB Payload Tables ---
+LW004_DEVICE_MODES = {1: "Standby", 2: "Timing", 3: "Periodic", 4: "Motion Stationary",
+                      5: "Motion Start", 6: "In Motion", 7: "Motion End"}
+LW004_AUX_OPERATIONS = {0: "None", 1: "Downlink Request", 2: "Man Down",
+                        3: "Alert Alarm", 4: "SOS Alarm"}
+LW004_BLUETOOTH_FPORTS = (8, 12) # Bluetooth location fixed payloads (carry beacon list)
+# Decoded device status fields stored on every beacon seen in a message
+DEVICE_STATUS_FIELDS = ("battery_level", "is_charging", "device_mode", "auxiliary_operation")
+
 # --- LoRa/AWS Client Class (Based on admin.py's LoRaClient, enhanced) ---
 class LoRaClient:
     """Handles communication with AWS IoT Core for LoRaWAN"""
@@ -495,11 +619,27 @@ class LoRaClient:
         self.mqtt_connection = None
         self.connected = False
         self.is_connecting = False # Flag to prevent multiple connect attempts
+        self._debug_raw_hex = bool(settings_manager.get("debug_raw_hex", False))
+        # Beacon RSSI arrives as a single signed byte, so every possible distance
+        # estimate is computed once here instead of calling pow() per beacon
+        self._distance_by_rssi_byte = tuple(
+            self.estimate_distance(b - 256 if b > 127 else b) for b in range(256)
+        )
 
-        # Inside the LoRaClient class in admin.py
+        # --- Reconnect State (driven by _on_connection_interrupted) ---
+        self._should_reconnect = False # True while the user wants to stay connected
+        self._retry_count = 0 # Manual reconnect attempts since the last successful connection
+        self._client_id = None # Client ID of the current session, reused by manual reconnects
+        self._reconnect_timer = None
+        self._reconnect_lock = threading.Lock() # Guards against overlapping reconnects
+        self._client_bootstrap = None # CRT event loop/resolver, created on first connect and reused
 
-    def connect(self):
-        """Connect to AWS IoT Core using a unique Client ID"""
+    def connect(self, interactive=True, client_id=None):
+        """Connect to AWS IoT Core using a unique Client ID
+
+        interactive=False suppresses error dialogs (used by background reconnects).
+        Passing client_id reuses that ID so the broker resumes its persistent session.
+        """
         # Ensure AWS SDK is available
         if not AWS_IOT_AVAILABLE:
             print("AWS IoT SDK not available. Cannot connect.")
@@ -523,38 +663,43 @@ class LoRaClient:
         # --- Validate Settings and File Paths ---
         if not all([endpoint, cert_file, key_file, root_ca, base_client_id]):
             print("Error: Incomplete AWS IoT connection settings.")
-            messagebox.showerror("Connection Error", "AWS IoT settings are incomplete. Please configure them via Admin Settings.")
-            return False
-        if not os.path.exists(cert_file):
-            print(f"Error: Certificate file not found: {cert_file}")
-            messagebox.showerror("Connection Error", f"Certificate file not found:\n{cert_file}\nPlease check Admin Settings.")
+            if interactive:
+                messagebox.showerror("Connection Error", "AWS IoT settings are incomplete. Please configure them via Admin Settings.")
             return False
-        if not os.path.exists(key_file):
-            print(f"Error: Key file not found: {key_file}")
-            messagebox.showerror("Connection Error", f"Key file not found:\n{key_file}\nPlease check Admin Settings.")
+        # Stat each credential file once and report every missing one together
+        credential_files = {"Certificate": cert_file, "Key": key_file, "Root CA": root_ca}
+        missing = [(name, path) for name, path in credential_files.items() if not os.path.exists(path)]
+        if missing:
+            for name, path in missing:
+                print(f"Error: {name} file not found: {path}")
+            if interactive:
+                details = "\n\n".join(f"{name} file not found:\n{path}" for name, path in missing)
+                messagebox.showerror("Connection Error", f"{details}\n\nPlease check Admin Settings.")
             return False
-        if not os.path.exists(root_ca):
-             print(f"Error: Root CA file not found: {root_ca}")
-             messagebox.showerror("Connection Error", f"Root CA file not found:\n{root_ca}\nPlease check Admin Settings.")
-             return False
 
         # --- Start Connection Process ---
         self.is_connecting = True
         try:
             # --- Setup CRT Resources ---
-            event_loop_group = io.EventLoopGroup(1)
-            host_resolver = io.DefaultHostResolver(event_loop_group)
-            client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
+            # One event loop thread and resolver serve every (re)connect of this client
+            if self._client_bootstrap is None:
+                event_loop_group = io.EventLoopGroup(1)
+                host_resolver = io.DefaultHostResolver(event_loop_group)
+                self._client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
 
             # --- Generate Unique Client ID ---
-            # Ensure base_client_id length allows for appending UUID within MQTT limits (e.g., 128 chars)
-            # Max MQTT ID length (check AWS docs, often 128) minus hyphen (1) minus UUID hex length (36)
-            max_base_len = 128 - 1 - 36
-            if len(base_client_id) > max_base_len:
-                print(f"Warning: Base client ID '{base_client_id}' too long, truncating.")
-                base_client_id = base_client_id[:max_base_len]
-            # Append a unique UUID to the base client ID
-            unique_client_id = f"{base_client_id}-{uuid.uuid4()}"
+            if client_id:
+                unique_client_id = client_id # Manual reconnect: keep the existing session
+            else:
+                # Ensure base_client_id length allows for appending UUID within MQTT limits (e.g., 128 chars)
+                # Max MQTT ID length (check AWS docs, often 128) minus hyphen (1) minus UUID hex length (36)
+                max_base_len = 128 - 1 - 36
+                if len(base_client_id) > max_base_len:
+                    print(f"Warning: Base client ID '{base_client_id}' too long, truncating.")
+                    base_client_id = base_client_id[:max_base_len]
+                # Append a unique UUID to the base client ID
+                unique_client_id = f"{base_client_id}-{uuid.uuid4()}"
+            self._client_id = unique_client_id
             # --- End Unique Client ID Generation ---
 
             print(f"Attempting to connect to {endpoint} with unique client ID '{unique_client_id}'...")
@@ -564,7 +709,7 @@ class LoRaClient:
                 endpoint=endpoint,
                 cert_filepath=cert_file,
                 pri_key_filepath=key_file,
-                client_bootstrap=client_bootstrap,
+                client_bootstrap=self._client_bootstrap,
                 ca_filepath=root_ca,
                 client_id=unique_client_id, # Use the generated unique client ID
                 on_connection_interrupted=self._on_connection_interrupted,
@@ -572,7 +717,10 @@ class LoRaClient:
                 # If you add an explicit on_success callback:
                 # on_connection_success=self._on_connection_success,
                 clean_session=False, # Keep session state on disconnect
-                keep_alive_secs=30   # Send keep-alive ping every 30 seconds
+                keep_alive_secs=30,  # Send keep-alive ping every 30 seconds
+                # The SDK's own reconnect resumes this session after an interruption
+                reconnect_min_timeout_secs=AWS_RECONNECT_MIN_SECS,
+                reconnect_max_timeout_secs=AWS_RECONNECT_MAX_SECS
             )
 
             # --- Initiate Connection ---
@@ -592,9 +740,9 @@ class LoRaClient:
             self.connected = True # Assume connected if no exception was raised by .result()
             print("Successfully connected to AWS IoT Core.")
 
-            # Reset reconnect attempts if implementing auto-reconnect logic
-            if hasattr(self, 'reconnect_attempts'):
-                 self.reconnect_attempts = 0
+            # Reset reconnect backoff and re-arm reconnects on interruption
+            self._retry_count = 0
+            self._should_reconnect = True
 
             # Subscribe to topics after successful connection
             # Note: _on_connection_resumed also handles re-subscription if needed
@@ -608,7 +756,8 @@ class LoRaClient:
             # Use traceback to get more details for debugging
             import traceback
             print(traceback.format_exc())
-            messagebox.showerror("Connection Error", f"Failed to connect to AWS IoT:\n{e}")
+            if interactive:
+                messagebox.showerror("Connection Error", f"Failed to connect to AWS IoT:\n{e}")
             self.connected = False
             self.mqtt_connection = None # Ensure connection object is cleared on failure
             return False # Indicate failed connection
@@ -619,6 +768,9 @@ class LoRaClient:
 
     def disconnect(self):
         """Disconnect from AWS IoT Core"""
+        # An intentional disconnect must not be undone by a pending reconnect
+        self._should_reconnect = False
+        self._cancel_reconnect()
         if self.mqtt_connection and self.connected:
             try:
                 print("Disconnecting from AWS IoT Core...")
@@ -642,18 +794,60 @@ class LoRaClient:
         """Handle connection interruption"""
         print(f"Connection interrupted. Error: {error}")
         self.connected = False
-        # Optional: Trigger a UI update or reconnection attempt here if needed
+        # The SDK keeps retrying (and resumes the session) by itself; only arm the manual fallback
+        if self._should_reconnect:
+            self._schedule_reconnect(AWS_MANUAL_RECONNECT_SECS)
 
     def _on_connection_resumed(self, connection, return_code, session_present, **kwargs):
         """Handle connection resumption"""
         print(f"Connection resumed. Return code: {return_code} Session present: {session_present}")
         self.connected = True
+        self._retry_count = 0
+        self._cancel_reconnect() # The SDK resumed on its own, no manual rebuild needed
         # Re-subscribe if session is not present
         if not session_present:
             print("Session not present. Re-subscribing...")
             self._subscribe_to_topics(connection)
         # Optional: Trigger a UI update here
 
+    def _schedule_reconnect(self, delay):
+        """Schedule a manual reconnect attempt in delay seconds"""
+        self._cancel_reconnect()
+        print(f"Manual AWS IoT reconnect in {delay}s unless the connection resumes (attempt {self._retry_count + 1})...")
+        self._reconnect_timer = threading.Timer(delay, self._reconnect)
+        self._reconnect_timer.daemon = True
+        self._reconnect_timer.start()
+
+    def _cancel_reconnect(self):
+        """Cancel a pending reconnect attempt, if any"""
+        if self._reconnect_timer:
+            self._reconnect_timer.cancel()
+            self._reconnect_timer = None
+
+    def _reconnect(self):
+        """Rebuild the connection when the SDK has not managed to resume it"""
+        if not self._reconnect_lock.acquire(blocking=False):
+            return # Another reconnect attempt is already running
+        try:
+            if self.connected or not self._should_reconnect:
+                return # Resumed in the meantime, or disconnected on purpose
+
+            self._retry_count += 1
+            # Stop the SDK's retries first so two connections never compete for the same client ID
+            old_connection = self.mqtt_connection
+            self.mqtt_connection = None
+            if old_connection:
+                try:
+                    old_connection.disconnect().result(10)
+                except Exception as e:
+                    print(f"Error releasing interrupted connection: {e}")
+
+            # Same client ID + clean_session=False: the broker hands back the queued QoS 1 messages
+            if not self.connect(interactive=False, client_id=self._client_id) and self._should_reconnect:
+                self._schedule_reconnect(min(AWS_RECONNECT_MAX_SECS, 2 ** self._retry_count))
+        finally:
+            self._reconnect_lock.release()
+
     def _on_connection_success(self, connection, callback_data):
         """Handle successful connection"""
         print("AWS IoT Core connection established!")
@@ -664,6 +858,8 @@ class LoRaClient:
         topic = self.settings_manager.get('topic', DEFAULT_TOPIC)
         alert_topic = self.settings_manager.get('alert_topic', DEFAULT_ALERT_TOPIC)
 
+        # Both topics stay at QoS 1: device uplinks (SOS presses included) arrive on the general
+        # topic and are recognised as alarms from their payload, so it must not drop to QoS 0
         topics_to_subscribe = set([topic, alert_topic]) # Use a set to avoid duplicate subscriptions
 
         for sub_topic in topics_to_subscribe:
@@ -686,8 +882,8 @@ class LoRaClient:
         """Handle message received from AWS IoT Core"""
         print(f"Received message on topic '{topic}'")
         try:
-            # Parse JSON message
-            message = json.loads(payload.decode('utf-8'))
+            # Parse JSON message straight from the raw bytes (no intermediate decode)
+            message = json_loads(payload)
 
             # Get FPort for filtering
             fport = None
@@ -725,10 +921,12 @@ class LoRaClient:
         except Exception as e:
             return {"error": f"Invalid Base64 payload: {e}", "raw_payload": payload_data}
 
-        result = {"raw_hex": binary_data.hex()}
+        result = {}
         data_len = len(binary_data)
 
         if data_len < 4:
+            if self._debug_raw_hex:
+                result["raw_hex"] = binary_data.hex()
             result["error"] = "Payload too short for standard header"
             return result
 
@@ -744,15 +942,10 @@ class LoRaClient:
             device_mode_code = (device_status >> 4) & 0x0F
             auxiliary_op_code = device_status & 0x0F
 
-            device_modes = {1: "Standby", 2: "Timing", 3: "Periodic", 4: "Motion Stationary",
-                            5: "Motion Start", 6: "In Motion", 7: "Motion End"}
-            aux_operations = {0: "None", 1: "Downlink Request", 2: "Man Down",
-                              3: "Alert Alarm", 4: "SOS Alarm"}
-
             result["device_mode_code"] = device_mode_code
             result["auxiliary_operation_code"] = auxiliary_op_code
-            result["device_mode"] = device_modes.get(device_mode_code, f"Unknown ({device_mode_code})")
-            result["auxiliary_operation"] = aux_operations.get(auxiliary_op_code, f"Unknown ({auxiliary_op_code})")
+            result["device_mode"] = LW004_DEVICE_MODES.get(device_mode_code, f"Unknown ({device_mode_code})")
+            result["auxiliary_operation"] = LW004_AUX_OPERATIONS.get(auxiliary_op_code, f"Unknown ({auxiliary_op_code})")
 
             # Bytes 2-3: Age (seconds)
             result["age"] = int.from_bytes(binary_data[2:4], byteorder='big')
@@ -764,11 +957,13 @@ class LoRaClient:
             result["error"] = f"Error parsing standard header: {e}"
             return result
 
+        if self._debug_raw_hex:
+            result["raw_hex"] = binary_data.hex()
 
         # --- FPort Specific Payloads ---
         try:
             # FPort 8 or 12: Bluetooth Location Fixed Payload
-            if fport in [8, 12] and data_len >= 4:
+            if fport in LW004_BLUETOOTH_FPORTS and data_len >= 4:
                 beacons = []
                 offset = 4
                 while offset + 7 <= data_len: # 6 bytes MAC + 1 byte RSSI
@@ -776,7 +971,7 @@ class LoRaClient:
                     mac_address = ':'.join(f'{b:02X}' for b in mac_bytes)
                     rssi_byte = binary_data[offset + 6]
                     rssi = rssi_byte - 256 if rssi_byte > 127 else rssi_byte
-                    est_distance = self.estimate_distance(rssi)
+                    est_distance = self._distance_by_rssi_byte[rssi_byte]
 
                     beacons.append({
                         "mac": mac_address,
@@ -862,13 +1057,37 @@ class CombinedApp:
         self.root.title(APP_TITLE)
         self.root.geometry("950x700") # Adjusted size
         self.root.minsize(800, 600)
+        # Screen size doesn't change while running; cache it instead of querying Tk for every popup
+        self._screen_w = self.root.winfo_screenwidth()
+        self._screen_h = self.root.winfo_screenheight()
 
         # --- Core Components ---
         self.settings = SettingsManager()
         self.db = BeaconDatabase() # Use the more featured DB from admin.py
         self.alarm_history = self.load_alarm_history()
-        self.beacons_mapping = {}
+        self._history_fp = None # Persistent append handle, owned by the history writer thread
+        self._history_write_q = queue.Queue() # ("append", line) / ("rewrite", entries) / ("stop", None)
+        self._history_writer = threading.Thread(target=self._history_writer_loop, daemon=True)
+        self._history_writer.start()
+        self._mac_to_room = {} # Flat MAC -> room / description lookups for the message hot path
+        self._mac_to_desc = {}
         self.load_beacons_mapping() # Load mapping on init
+        self._update_alert_topic_prefix()
+
+        self._history_refresh_after_id = None # Pending coalesced history redraw, if any
+        self._history_matches = [] # (position, alarm) pairs matching the current search, newest first
+        self._history_shown = 0 # How many of those are rendered
+        self._history_total = 0
+        self._history_limit = HISTORY_PAGE_SIZE # Rendered rows requested via "Show More"
+        self._history_search_text = ""
+
+        # Single reusable alarm popup (built on the first alarm, then hidden/shown)
+        self._alert_window = None
+        self._alert_canvas = None
+        self._alert_items = {}
+        self._alert_blink_after_id = None
+        self._alert_blink_on = True
+        self._alert_blink_ms = DEFAULT_SETTINGS["alert_blink_ms"]
 
         self.aws_client = None
         self.aws_connection_status = tk.StringVar(value="Disconnected")
@@ -889,6 +1108,11 @@ class CombinedApp:
         self.admin_beacons_window = None
         self.admin_logs_window = None
         self.admin_settings_window = None
+        self._about_text = None # Built on first use by show_about
+
+        # Connection threads post their outcome here and signal the Tk thread with one virtual event
+        self._aws_connection_result = ("Disconnected", "")
+        self.root.bind("<<AwsConnectionChanged>>", self._on_aws_connection_changed)
 
         # --- Auto-Connect & Reconnect ---
         self.connect_to_aws()
@@ -1145,6 +1369,8 @@ class CombinedApp:
         ttk.Button(actions_frame, text="Refresh", style="Action.TButton", command=self.refresh_history_display, width=10).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(actions_frame, text="Export", style="Action.TButton", command=self.export_history, width=10).pack(side=tk.LEFT, padx=5)
         ttk.Button(actions_frame, text="Clear", style="Action.TButton", command=self.clear_history, width=10).pack(side=tk.LEFT, padx=5)
+        self.show_more_button = ttk.Button(actions_frame, text="Show More", style="Action.TButton", command=self.show_more_history, width=10)
+        self.show_more_button.pack(side=tk.LEFT, padx=5)
 
         # Search box
         search_frame = ttk.Frame(toolbar_frame)
@@ -1153,13 +1379,23 @@ class CombinedApp:
         self.search_var = tk.StringVar()
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=25)
         search_entry.pack(side=tk.LEFT)
-        search_entry.bind("<KeyRelease>", lambda event: self.refresh_history_display())
+        # Redraw once typing pauses instead of on every keystroke
+        self.search_var.trace_add("write", lambda *args: self.schedule_history_refresh(SEARCH_DEBOUNCE_MS, restart=True))
 
         # History display area
         self.history_text = scrolledtext.ScrolledText(
             history_frame, wrap=tk.WORD, font=("Segoe UI", 10), background="white", relief="flat", borderwidth=1
         )
         self.history_text.pack(fill=tk.BOTH, expand=True)
+        # Configure tags for better display (once; refresh only inserts tagged text)
+        self.history_text.tag_configure('heading', font=("Segoe UI", 14, "bold"), foreground="#e74c3c") # Red heading for alerts
+        self.history_text.tag_configure('date', font=("Segoe UI", 10), foreground="#555")
+        self.history_text.tag_configure('room', font=("Segoe UI", 12, "bold"), foreground="#555") # Blue for room
+        self.history_text.tag_configure('mac', font=("Consolas", 10), foreground="#3f51b5")
+        self.history_text.tag_configure('desc', font=("Segoe UI", 10, "italic"), foreground="#555") # Grey italic for desc
+        self.history_text.tag_configure('label', font=("Segoe UI", 10, "bold"), foreground="black")
+        self.history_text.tag_configure('value', font=("Segoe UI", 10), foreground="black")
+        self.history_text.tag_configure("empty", justify="center", font=("Segoe UI", 12, "italic"), foreground="#9e9e9e")
         self.history_text.config(state=tk.DISABLED) # Start disabled
 
         # Status bar
@@ -1203,21 +1439,14 @@ class CombinedApp:
         """Background thread for AWS connection"""
         if not self.aws_client:
              print("Error: AWS client not initialized.") # Should not happen
-             self.root.after(0, lambda: self.aws_connection_status.set("Disconnected"))
-             self.root.after(0, self.update_aws_connection_display)
-             self.root.after(0, lambda: self.update_status_bar("Error: AWS client not ready."))
+             self._post_aws_connection_result("Disconnected", "Error: AWS client not ready.")
              return
 
         if self.aws_client.connect():
-            self.root.after(0, lambda: self.aws_connection_status.set("Connected"))
-            self.root.after(0, lambda: self.update_status_bar(f"Connected to AWS: {self.settings.get('aws_endpoint')}"))
+            self._post_aws_connection_result("Connected", f"Connected to AWS: {self.settings.get('aws_endpoint')}")
         else:
-            self.root.after(0, lambda: self.aws_connection_status.set("Disconnected"))
-            self.root.after(0, lambda: self.update_status_bar("Failed to connect to AWS IoT Core. Check settings."))
             # No automatic messagebox here, rely on LoRaClient's messages for specifics
-
-        # Update display regardless of outcome
-        self.root.after(0, self.update_aws_connection_display)
+            self._post_aws_connection_result("Disconnected", "Failed to connect to AWS IoT Core. Check settings.")
 
     def disconnect_from_aws(self):
         """Disconnect from AWS IoT Core"""
@@ -1232,13 +1461,25 @@ class CombinedApp:
 
     def _aws_disconnect_thread(self):
          if self.aws_client.disconnect():
-              self.root.after(0, lambda: self.aws_connection_status.set("Disconnected"))
-              self.root.after(0, lambda: self.update_status_bar("Disconnected from AWS IoT Core."))
+              self._post_aws_connection_result("Disconnected", "Disconnected from AWS IoT Core.")
          else:
-              self.root.after(0, lambda: self.update_status_bar("Error during AWS disconnection."))
               # Still update status to disconnected as the attempt was made
-              self.root.after(0, lambda: self.aws_connection_status.set("Disconnected"))
-         self.root.after(0, self.update_aws_connection_display)
+              self._post_aws_connection_result("Disconnected", "Error during AWS disconnection.")
+
+    def _post_aws_connection_result(self, status, message):
+         """Hand a connection outcome from a worker thread to the Tk thread"""
+         self._aws_connection_result = (status, message)
+         try:
+              self.root.event_generate("<<AwsConnectionChanged>>", when="tail")
+         except (tk.TclError, RuntimeError) as e:
+              print(f"Could not post AWS connection status (window closing?): {e}")
+
+    def _on_aws_connection_changed(self, event=None):
+         """Apply the latest connection outcome to the status widgets (Tk thread)"""
+         status, message = self._aws_connection_result
+         self.aws_connection_status.set(status)
+         self.update_status_bar(message)
+         self.update_aws_connection_display()
 
 
     def check_aws_connection(self):
@@ -1269,6 +1510,13 @@ class CombinedApp:
               self.aws_status_label.configure(style="Disconnected.TLabel")
 
 
+    def _update_alert_topic_prefix(self):
+        """Cache the alert topic prefix used to classify incoming messages"""
+        alert_topic = self.settings.get('alert_topic', DEFAULT_ALERT_TOPIC)
+        # Wildcards are stripped so the per-message check is a plain prefix test;
+        # None disables topic-based alerts when no alert topic is configured
+        self._alert_topic_prefix = alert_topic.replace('#', '').replace('+', '') if alert_topic else None
+
     # ==============================================================
     # --- Modified handle_aws_message Function ---
     # ==============================================================
@@ -1277,7 +1525,6 @@ class CombinedApp:
         print(f"Callback: Message received on topic '{topic}'")
         try:
             timestamp = datetime.now().isoformat()
-            alert_topic = self.settings.get('alert_topic', DEFAULT_ALERT_TOPIC)
 
             # Determine if this message indicates an alert condition
             is_alert = False
@@ -1285,7 +1532,7 @@ class CombinedApp:
                 aux_op = decoded_payload.get("auxiliary_operation", "")
                 if "Alert Alarm" in aux_op or "SOS Alarm" in aux_op:
                     is_alert = True
-            if not is_alert and alert_topic and topic.startswith(alert_topic.replace('#', '').replace('+', '')):
+            if not is_alert and self._alert_topic_prefix is not None and topic.startswith(self._alert_topic_prefix):
                  is_alert = True
 
             # --- Initialize Alert Data ---
@@ -1305,6 +1552,8 @@ class CombinedApp:
             # --- Find Closest Beacon from Payload (if available) ---
             closest_beacon = None
             min_distance = float('inf')
+            # Device status is the same for every beacon in the message, so slice it out once
+            device_status = {key: decoded_payload.get(key) for key in DEVICE_STATUS_FIELDS}
 
             if decoded_payload and "beacons" in decoded_payload and decoded_payload["beacons"]:
                 detected_beacons = decoded_payload["beacons"]
@@ -1317,20 +1566,13 @@ class CombinedApp:
                     rssi = beacon.get("rssi")
 
                     # Update the signal info for this specific beacon in the database
-                    self.db.update_beacon_signal(
-                        mac, rssi,
-                        battery_level=decoded_payload.get("battery_level"), # Use main device battery for now
-                        is_charging=decoded_payload.get("is_charging"),     # Use main device charging status
-                        device_mode=decoded_payload.get("device_mode"),       # Use main device mode
-                        auxiliary_operation=decoded_payload.get("auxiliary_operation"), # Use main device aux op
-                        estimated_distance=dist
-                    )
+                    # (battery, charging, mode and aux op come from the main device for now)
+                    self.db.update_beacon_signal(mac, rssi, estimated_distance=dist, **device_status)
 
                     # Check if this beacon is closer than the current minimum
                     if mac and dist is not None and dist < min_distance:
                         # Check if this closer beacon is actually mapped
-                        mapping_info = self.beacons_mapping.get(mac)
-                        if mapping_info: # Only consider mapped beacons as the 'closest known'
+                        if mac in self._mac_to_room: # Only consider mapped beacons as the 'closest known'
                              min_distance = dist
                              closest_beacon = beacon
                              print(f"New closest mapped beacon found: {mac} at {dist}m") # Debug print
@@ -1340,10 +1582,10 @@ class CombinedApp:
                 if closest_beacon:
                     alert_mac = closest_beacon.get("mac")
                     alert_rssi = closest_beacon.get("rssi") # Use the closest beacon's RSSI
-                    mapping_info = self.beacons_mapping.get(alert_mac)
-                    if mapping_info:
-                        alert_room = mapping_info.get("room_number", "Mapping Error")
-                        alert_desc = mapping_info.get("description", "")
+                    room = self._mac_to_room.get(alert_mac)
+                    if room is not None:
+                        alert_room = room
+                        alert_desc = self._mac_to_desc.get(alert_mac, "")
                     else:
                         # This case should technically not happen due to the check above,
                         # but handle defensively
@@ -1358,21 +1600,17 @@ class CombinedApp:
                 if alert_mac:
                     self.db.update_beacon_signal(
                         alert_mac, alert_rssi, # Use gateway RSSI
-                        battery_level=decoded_payload.get("battery_level"),
-                        is_charging=decoded_payload.get("is_charging"),
-                        device_mode=decoded_payload.get("device_mode"),
-                        auxiliary_operation=decoded_payload.get("auxiliary_operation")
-                        # No estimated distance here
+                        **device_status # No estimated distance here
                     )
 
             # --- Look up room for the determined alert_mac (closest mapped or fallback device ID) ---
             if alert_mac: # Ensure we have a MAC to look up
-                mapping_info = self.beacons_mapping.get(alert_mac)
-                if mapping_info:
+                room = self._mac_to_room.get(alert_mac)
+                if room is not None:
                     # Only override if we didn't already set it from the closest beacon loop
                     if closest_beacon is None:
-                         alert_room = mapping_info.get("room_number", "Mapping Error")
-                         alert_desc = mapping_info.get("description", "")
+                         alert_room = room
+                         alert_desc = self._mac_to_desc.get(alert_mac, "")
                 else:
                      # Only set to unknown if we didn't find a closest beacon and the device ID isn't mapped
                     if closest_beacon is None:
@@ -1404,9 +1642,9 @@ class CombinedApp:
                 }
 
                 # Add to alarm history list
-                self.alarm_history.append(alert_data)
-                self.save_alarm_history() # Save immediately
-                self.refresh_history_display() # Update the UI
+                self.add_alarm_to_history(index_alarm(alert_data))
+                self.append_alarm_history(alert_data) # Append one line instead of rewriting the file
+                self.schedule_history_refresh() # Update the UI (coalesced with other alarms in a burst)
                 self.show_alert_notification(alert_data) # Show popup
 
             # Refresh admin dashboard if open and auto-refresh is on
@@ -1431,163 +1669,359 @@ class CombinedApp:
 
     # --- History Handling (from client.py) ---
     def load_alarm_history(self):
-        """Load alarm history from file"""
-        if os.path.exists(ALARM_HISTORY_FILE):
+        """Load alarm history from the JSON Lines file (migrating the legacy JSON file once)
+
+        Returns a deque capped at MAX_ALARM_HISTORY entries (newest kept).
+        """
+        if not os.path.exists(ALARM_HISTORY_FILE):
+            if os.path.exists(LEGACY_ALARM_HISTORY_FILE):
+                return deque(self._migrate_legacy_alarm_history(), maxlen=MAX_ALARM_HISTORY)
+            return deque(maxlen=MAX_ALARM_HISTORY)
+
+        history = deque(maxlen=MAX_ALARM_HISTORY)
+        record_count = 0
+        try:
+            with open(ALARM_HISTORY_FILE, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        history.append(index_alarm(json_loads(line)))
+                        record_count += 1
+                    except ValueError: # JSONDecodeError, or UnicodeDecodeError for a line cut mid-character
+                        # A crash mid-write can only damage a single line, keep the rest
+                        print(f"Skipping corrupted alarm history line {line_number} in {ALARM_HISTORY_FILE}")
+        except Exception as e:
+            print(f"Error loading alarm history: {e}")
+
+        # The in-memory history is kept oldest -> newest; lines are normally already in order,
+        # so this is a near-linear pass that only fixes alarms that were written late
+        try:
+            history = deque(sorted(history, key=alarm_sort_key), maxlen=MAX_ALARM_HISTORY)
+        except Exception as e:
+            print(f"Error sorting alarm history, keeping file order: {e}")
+
+        # Compact the file once it holds more alarms than are kept in memory
+        if record_count > MAX_ALARM_HISTORY:
             try:
-                with open(ALARM_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                    # Handle empty file case
-                    content = f.read()
-                    if not content:
-                        return []
-                    return json.loads(content)
-            except json.JSONDecodeError:
-                 print(f"Error: Alarm history file ({ALARM_HISTORY_FILE}) is corrupted. Creating a new one.")
-                 # Optionally backup the corrupted file
-                 # os.rename(ALARM_HISTORY_FILE, ALARM_HISTORY_FILE + ".corrupted")
-                 return [] # Return empty list
+                self._write_alarm_history_file(history)
+                print(f"Trimmed alarm history file to the newest {MAX_ALARM_HISTORY} alarms.")
             except Exception as e:
-                print(f"Error loading alarm history: {e}")
-                return [] # Return empty list on other errors
-        return []
+                print(f"Error trimming alarm history file: {e}")
+        return history
 
+    def _migrate_legacy_alarm_history(self):
+        """Convert the old single-document alarm_history.json to JSON Lines"""
+        try:
+            with open(LEGACY_ALARM_HISTORY_FILE, 'rb') as f:
+                content = f.read()
+            history = json_loads(content) if content else []
+        except ValueError: # Invalid JSON or invalid UTF-8
+            print(f"Error: Alarm history file ({LEGACY_ALARM_HISTORY_FILE}) is corrupted. Creating a new one.")
+            return []
+        except Exception as e:
+            print(f"Error loading legacy alarm history: {e}")
+            return []
 
-    def save_alarm_history(self):
-        """Save alarm history to file"""
+        if not isinstance(history, list):
+            history = []
+        for alarm in history:
+            index_alarm(alarm)
+        try:
+            history.sort(key=alarm_sort_key)
+        except Exception as e:
+            print(f"Error sorting legacy alarm history, keeping file order: {e}")
+        try:
+            self._write_alarm_history_file(history)
+            # Keep the old file as a backup instead of deleting it
+            os.replace(LEGACY_ALARM_HISTORY_FILE, LEGACY_ALARM_HISTORY_FILE + ".migrated")
+            print(f"Migrated {len(history)} alarms to {ALARM_HISTORY_FILE}")
+        except Exception as e:
+            print(f"Error migrating alarm history: {e}")
+        return history
+
+    def _write_alarm_history_file(self, entries):
+        """Rewrite the whole history file atomically (temp file + rename)"""
+        os.makedirs(os.path.dirname(ALARM_HISTORY_FILE), exist_ok=True)
+        temp_file = ALARM_HISTORY_FILE + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write("".join(json_dumps(alarm_record(entry)) + "\n" for entry in entries))
+        os.replace(temp_file, ALARM_HISTORY_FILE)
+
+    def _open_history_log(self):
+        """Open the persistent append handle for the history file"""
         try:
-            # Ensure the directory exists
             os.makedirs(os.path.dirname(ALARM_HISTORY_FILE), exist_ok=True)
-            with open(ALARM_HISTORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.alarm_history, f, indent=4)
+            self._history_fp = open(ALARM_HISTORY_FILE, 'a', encoding='utf-8')
+            # A crash mid-write leaves a last line without its newline; end it so the next
+            # alarm starts on a fresh line instead of being glued onto the broken fragment
+            if self._history_fp.tell() > 0:
+                with open(ALARM_HISTORY_FILE, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._history_fp.write("\n")
+                        self._history_fp.flush()
+        except Exception as e:
+            print(f"Error opening alarm history file: {e}")
+            self._history_fp = None
+
+    def _close_history_log(self):
+        """Close the persistent append handle, if open"""
+        if self._history_fp:
+            try:
+                self._history_fp.close()
+            except Exception as e:
+                print(f"Error closing alarm history file: {e}")
+            self._history_fp = None
+
+    def _history_writer_loop(self):
+        """Background thread that performs all alarm history file writes"""
+        self._open_history_log()
+        while True:
+            batch = [self._history_write_q.get()]
+            # Drain everything queued meanwhile so a burst becomes a single write + flush
+            while True:
+                try:
+                    batch.append(self._history_write_q.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending_lines = []
+            stop = False
+            for kind, payload in batch:
+                if kind == "append":
+                    try:
+                        pending_lines.append(json_dumps(payload) + "\n")
+                    except Exception as e:
+                        self._report_history_save_error(e) # Skip only the alarm that can't be serialized
+                elif kind == "rewrite":
+                    # The snapshot already contains every alarm appended before it
+                    pending_lines = []
+                    self._rewrite_history_log(payload)
+                elif kind == "stop":
+                    stop = True
+
+            if pending_lines:
+                try:
+                    if self._history_fp is None:
+                        self._open_history_log()
+                    self._history_fp.write("".join(pending_lines))
+                    self._history_fp.flush()
+                except Exception as e:
+                    self._report_history_save_error(e)
+
+            if stop:
+                self._close_history_log()
+                return
+
+    def _rewrite_history_log(self, entries):
+        """Replace the history file with entries (runs on the writer thread)"""
+        try:
+            self._close_history_log()
+            self._write_alarm_history_file(entries)
+        except Exception as e:
+            self._report_history_save_error(e)
+        finally:
+            self._open_history_log()
+
+    def _report_history_save_error(self, error):
+        """Report a history write failure from the writer thread on the Tk thread"""
+        print(f"Error saving alarm history: {error}")
+        self.root.after(0, lambda: messagebox.showerror(
+            "Save Error", f"Could not save alarm history:\n{error}", parent=self.root))
+
+    def add_alarm_to_history(self, alarm):
+        """Insert an alarm into the in-memory history, keeping it sorted oldest -> newest"""
+        history = self.alarm_history
+        key = alarm_sort_key(alarm)
+        if not history or alarm_sort_key(history[-1]) <= key:
+            history.append(alarm) # Usual case: alarms arrive in time order
+            return
+        # Out-of-order alarm (e.g. clock adjusted): binary search for its slot
+        low, high = 0, len(history)
+        while low < high:
+            mid = (low + high) // 2
+            if alarm_sort_key(history[mid]) <= key:
+                low = mid + 1
+            else:
+                high = mid
+        if len(history) == history.maxlen:
+            if low == 0:
+                return # Older than every kept alarm, so it would be dropped right away
+            history.popleft() # Drop the oldest alarm, as append() does on a full deque
+            low -= 1
+        history.insert(low, alarm)
+
+    def append_alarm_history(self, alert_data):
+        """Queue a single alarm to be appended to the history file (serialized on the writer thread)"""
+        try:
+            # alarm_record makes a shallow copy, so later in-memory changes can't race the writer
+            self._history_write_q.put(("append", alarm_record(alert_data)))
         except Exception as e:
             print(f"Error saving alarm history: {e}")
             messagebox.showerror("Save Error", f"Could not save alarm history:\n{e}", parent=self.root)
 
+    def save_alarm_history(self):
+        """Queue a full rewrite of the alarm history file from memory (e.g. after clearing)"""
+        self._history_write_q.put(("rewrite", list(self.alarm_history)))
+
+    def schedule_history_refresh(self, delay_ms=HISTORY_REFRESH_MS, restart=False):
+        """Schedule one coalesced history redraw
+
+        New alarms keep an already pending redraw (so a steady stream still refreshes);
+        restart=True pushes it back instead, debouncing search typing.
+        """
+        if self._history_refresh_after_id is not None:
+            if not restart:
+                return # A refresh is already queued and will pick up the new alarm
+            self.root.after_cancel(self._history_refresh_after_id)
+        self._history_refresh_after_id = self.root.after(delay_ms, self._run_scheduled_history_refresh)
+
+    def _run_scheduled_history_refresh(self):
+        """Run a refresh queued by schedule_history_refresh"""
+        self._history_refresh_after_id = None
+        self.refresh_history_display()
+
     def refresh_history_display(self):
         """Refresh the alarm history display"""
         if not hasattr(self, 'history_text') or not self.history_text.winfo_exists():
              return # Avoid error if UI not ready
 
+        # Unmap the text widget while it is rebuilt so Tk skips per-line layout and redraws,
+        # then pack it back exactly where it was (pack calls go to ScrolledText's frame)
+        pack_info = self.history_text.pack_info()
+        self.history_text.pack_forget()
+        try:
+             self._rebuild_history_text()
+        finally:
+             self.history_text.pack(**pack_info)
+
+    def _rebuild_history_text(self):
+        """Clear history_text and render the first pages of alarms matching the search box"""
         self.history_text.config(state=tk.NORMAL)
         self.history_text.delete(1.0, tk.END)
-
-        # Configure tags for better display
-        self.history_text.tag_configure('heading', font=("Segoe UI", 14, "bold"), foreground="#e74c3c") # Red heading for alerts
-        self.history_text.tag_configure('date', font=("Segoe UI", 10), foreground="#555")
-        self.history_text.tag_configure('room', font=("Segoe UI", 12, "bold"), foreground="#555") # Blue for room
-        self.history_text.tag_configure('mac', font=("Consolas", 10), foreground="#3f51b5")
-        self.history_text.tag_configure('desc', font=("Segoe UI", 10, "italic"), foreground="#555") # Grey italic for desc
-        self.history_text.tag_configure('label', font=("Segoe UI", 10, "bold"), foreground="black")
-        self.history_text.tag_configure('value', font=("Segoe UI", 10), foreground="black") 
-        self.history_text.tag_configure("empty", justify="center", font=("Segoe UI", 12, "italic"), foreground="#9e9e9e")
+        self._history_matches = []
+        self._history_shown = 0
 
         if not self.alarm_history:
             self.history_text.insert(tk.END, "Alarm history is empty.", "empty")
             self.history_text.config(state=tk.DISABLED)
+            self.show_more_button.state(["disabled"])
             self.update_status_bar("Alarm history is empty.")
             return
 
         # Get search filter
         search_text = self.search_var.get().lower()
+        if search_text != self._history_search_text:
+             self._history_search_text = search_text
+             self._history_limit = HISTORY_PAGE_SIZE # A new search starts again from the first page
 
-        # Sort history by timestamp (newest first)
-        try:
-             sorted_history = sorted(
-                 [alarm for alarm in self.alarm_history if isinstance(alarm, dict) and 'timestamp' in alarm], # Filter out invalid entries
-                 key=lambda x: x.get('timestamp', '0'), # Default to oldest if timestamp missing
-                 reverse=True
-             )
-        except Exception as e:
-             print(f"Error sorting history: {e}")
-             messagebox.showerror("History Error", "Could not sort alarm history.", parent=self.root)
-             sorted_history = self.alarm_history # Show unsorted if error
+        # History is kept sorted oldest -> newest, so walking it backwards gives newest first
+        sorted_history = [alarm for alarm in reversed(self.alarm_history)
+                          if isinstance(alarm, dict) and 'timestamp' in alarm] # Filter out invalid entries
+        self._history_total = len(sorted_history) # Get total before filtering
 
-        displayed_count = 0
-        total_alarms = len(sorted_history) # Get total before filtering
+        # Filter against the search text precomputed by index_alarm (one substring test per alarm);
+        # positions are kept so alarm numbers stay relative to the full history
+        if search_text:
+             self._history_matches = [(i, alarm) for i, alarm in enumerate(sorted_history) if search_text in alarm.get('_search', '')]
+        else:
+             self._history_matches = list(enumerate(sorted_history))
 
-        for i, alarm in enumerate(sorted_history):
-             # Basic check if alarm is a dict
-             if not isinstance(alarm, dict):
-                  print(f"Skipping invalid history entry: {alarm}")
-                  continue
+        # Only the pages the user has asked for are rendered; "Show More" appends the next one
+        self._append_history_entries(self._history_limit)
 
-             # Format entry text for searching
-             try:
-                 alarm_str = f"{alarm.get('timestamp','')} {alarm.get('room_number','')} {alarm.get('beacon_mac','')} {alarm.get('description','')}"
-                 alarm_str = alarm_str.lower()
-             except Exception:
-                 alarm_str = "" # Handle potential errors in getting values
+        # If nothing to display after filtering or initially
+        if self._history_shown == 0:
+             if search_text:
+                  self.history_text.insert(tk.END, f"No alarms found matching '{search_text}'.", "empty")
+             elif not self.alarm_history: # Check again if the list itself is empty
+                  self.history_text.insert(tk.END, "Alarm history is empty.", "empty")
 
-             # Skip if doesn't match search criteria
-             if search_text and search_text not in alarm_str:
-                continue
+        self.history_text.config(state=tk.DISABLED)
+        self.history_text.yview(tk.END) # Scroll to the bottom (most recent)
 
-            # Format timestamp
-             try:
-                 dt_str = alarm.get('timestamp', '')
-                 if dt_str:
-                      # Handle potential timezone info if present (e.g., 'Z' or '+HH:MM')
-                      if dt_str.endswith('Z'):
-                          dt_str = dt_str[:-1] + '+00:00'
-                      # Ensure dt is timezone-aware if it has offset, otherwise assume local
-                      if '+' in dt_str or '-' in dt_str[10:]: # Check for offset info
-                           dt = datetime.fromisoformat(dt_str)
-                      else: # Assume naive timestamp is local
-                           dt_naive = datetime.fromisoformat(dt_str)
-                           dt = dt_naive.astimezone() # Convert to local timezone-aware
-
-                      timestamp_str = dt.strftime("%Y-%m-%d %H:%M:%S %Z") # Display timezone
-                 else:
-                      timestamp_str = "Unknown Time"
-             except ValueError:
-                 timestamp_str = alarm.get('timestamp', 'Invalid Time Format')
-             except Exception as e:
-                 timestamp_str = f"Time Error: {e}"
+    def show_more_history(self):
+        """Append the next page of matching alarms to the history display"""
+        if self._history_shown >= len(self._history_matches):
+             return
+        self._history_limit = self._history_shown + HISTORY_PAGE_SIZE
+        self.history_text.config(state=tk.NORMAL)
+        self._append_history_entries(self._history_limit)
+        self.history_text.config(state=tk.DISABLED)
+
+    def _append_history_entries(self, limit):
+        """Insert matches[shown:limit] after the current entries (history_text must be editable)"""
+        parts = [] # Interleaved text, tags, text, tags ... for a single Text.insert
 
+        for i, alarm in self._history_matches[self._history_shown:limit]:
+             # Display time is formatted once by index_alarm when the alarm is added/loaded
+             timestamp_str = alarm.get('_display_ts') or alarm.get('timestamp', 'Invalid Time Format')
 
              room = alarm.get('room_number', 'Unknown')
              beacon_mac = alarm.get('beacon_mac', 'N/A')
              description = alarm.get('description', '') # Get description from alert data
 
              # Format entry
-             self.history_text.insert(tk.END, f"🚨 ALARM #{total_alarms - i}\n", 'heading') # Number newest as #1 based on total alarms
-             self.history_text.insert(tk.END, f"{timestamp_str}\n", 'date')
-             self.history_text.insert(tk.END, f"Room: ", 'label')
-             self.history_text.insert(tk.END, f"{room}\n", 'room')
+             parts += (f"🚨 ALARM #{self._history_total - i}\n", 'heading', # Number newest as #1 based on total alarms
+                       f"{timestamp_str}\n", 'date',
+                       "Room: ", 'label',
+                       f"{room}\n", 'room')
              if description:
-                  self.history_text.insert(tk.END, f"Desc: ", 'label')
-                  self.history_text.insert(tk.END, f"{description}\n", 'desc')
-             self.history_text.insert(tk.END, f"Beacon: ", 'label')
-             self.history_text.insert(tk.END, f"{beacon_mac}\n", 'mac')
-             self.history_text.insert(tk.END, f"RSSI: ", 'label')
-             self.history_text.insert(tk.END, f"{alarm.get('rssi', 'N/A')}\n", 'value')
+                  parts += ("Desc: ", 'label', f"{description}\n", 'desc')
+             parts += ("Beacon: ", 'label',
+                       f"{beacon_mac}\n", 'mac',
+                       "RSSI: ", 'label',
+                       f"{alarm.get('rssi', 'N/A')}\n", 'value')
 
              # Optionally add more decoded details if needed
              # decoded = alarm.get('decoded_payload', {})
              # if decoded:
-             #     self.history_text.insert(tk.END, f"Mode: {decoded.get('device_mode', 'N/A')}\n", 'value')
-             #     self.history_text.insert(tk.END, f"Battery: {decoded.get('battery', 'N/A')}\n", 'value')
-
-
-             self.history_text.insert(tk.END, "-" * 60 + "\n\n")
-             displayed_count += 1
-
-        # If nothing to display after filtering or initially
-        if displayed_count == 0:
-             if search_text:
-                  self.history_text.insert(tk.END, f"No alarms found matching '{search_text}'.", "empty")
-             elif not self.alarm_history: # Check again if the list itself is empty
-                  self.history_text.insert(tk.END, "Alarm history is empty.", "empty")
-
+             #     parts += (f"Mode: {decoded.get('device_mode', 'N/A')}\n", 'value')
+             #     parts += (f"Battery: {decoded.get('battery', 'N/A')}\n", 'value')
+
+
+             parts += (HISTORY_ENTRY_SEPARATOR, ())
+        self._history_shown = min(limit, len(self._history_matches))
+
+        # Remove the "more matches" footer from the previous page, if any
+        footer = self.history_text.tag_ranges('footer')
+        if footer:
+             self.history_text.delete(footer[0], footer[-1])
+        matched_count = len(self._history_matches)
+        more_available = self._history_shown < matched_count
+        if more_available:
+             parts += (f"Showing the newest {self._history_shown} of {matched_count} matching alarms. "
+                       "Use 'Show More' or refine the search.", ('empty', 'footer'))
+
+        if parts:
+             # One plain insert, then one tag_add per tag carrying all of its ranges. Ranges are
+             # tracked as line.column; text that may hold non-BMP characters (emoji, free-text
+             # fields) always ends its line, so no column is ever counted past it.
+             line, col = map(int, self.history_text.index("end-1c").split("."))
+             tag_ranges = {}
+             for text, tags in zip(parts[::2], parts[1::2]):
+                  start = f"{line}.{col}"
+                  newlines = text.count("\n")
+                  if newlines:
+                       line += newlines
+                       col = len(text) - text.rfind("\n") - 1
+                  else:
+                       col += len(text)
+                  for tag in ((tags,) if isinstance(tags, str) else tags):
+                       tag_ranges.setdefault(tag, []).extend((start, f"{line}.{col}"))
+             self.history_text.insert(tk.END, "".join(parts[::2]))
+             for tag, ranges in tag_ranges.items():
+                  self.history_text.tag_add(tag, *ranges)
+        self.show_more_button.state(["!disabled" if more_available else "disabled"])
 
         # Update status bar
-        status_msg = f"Displayed {displayed_count} of {total_alarms} alarms."
-        if search_text:
-            status_msg += f" (Filter: '{search_text}')"
+        status_msg = f"Displayed {self._history_shown} of {self._history_total} alarms."
+        if self._history_search_text:
+            status_msg += f" (Filter: '{self._history_search_text}')"
         self.update_status_bar(status_msg)
 
-        self.history_text.config(state=tk.DISABLED)
-        self.history_text.yview(tk.END) # Scroll to the bottom (most recent)
-
 
     def export_history(self):
         """Export alarm history to a JSON file"""
@@ -1600,15 +2034,15 @@ class CombinedApp:
             title="Export Alarm History",
             defaultextension=".json",
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-            initialfile=f"alarm_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            initialfile=f"alarm_history_{file_timestamp()}.json"
         )
 
         if not filename:
             return # User cancelled
 
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.alarm_history, f, indent=4, ensure_ascii=False)
+            with open(filename, 'wb', opener=sequential_opener) as f:
+                f.write(json_dumpb([alarm_record(alarm) for alarm in self.alarm_history], indent=True))
             messagebox.showinfo("Export Complete", f"Alarm history successfully exported to:\n{filename}", parent=self.root)
             self.update_status_bar(f"History exported to {os.path.basename(filename)}")
         except Exception as e:
@@ -1622,126 +2056,133 @@ class CombinedApp:
             return
 
         if messagebox.askyesno("Confirm Clear", "Are you sure you want to permanently delete all alarm history entries?", parent=self.root):
-            self.alarm_history = []
+            self.alarm_history.clear()
             self.save_alarm_history() # Save the empty list
             self.refresh_history_display()
             messagebox.showinfo("Clear History", "Alarm history has been cleared.", parent=self.root)
             self.update_status_bar("Alarm history cleared.")
 
     # --- Alert Notification (from client.py, enhanced) ---
-    def show_alert_notification(self, alert_data):
-        """Show a fullscreen notification for a new alert"""
-        # Create a new top-level window
+    def _build_alert_window(self):
+        """Create the fullscreen alert window once; later alarms reuse it"""
         alert_window = tk.Toplevel(self.root)
+        alert_window.withdraw() # Hidden until an alarm arrives
         alert_window.title("🚨 ALARM! 🚨")
-        alert_window.attributes("-topmost", True)
-        alert_window.attributes("-fullscreen", True) # Make it fullscreen
         alert_window.configure(background="red") # Start with red background
 
-        # --- Blinking Effect ---
-        self.blink_on = True
-        def blink():
-            if not alert_window.winfo_exists(): # Stop if window closed
-                 return
-            current_color = "red" if self.blink_on else "black"
-            alert_window.configure(background=current_color)
-            # Also configure child frames/labels if needed
-            for widget in alert_window.winfo_children():
-                try: # Set background for ttk widgets differently
-                    if isinstance(widget, ttk.Frame) or isinstance(widget, ttk.Label):
-                         style_name = f"Blink.{widget.winfo_class()}"
-                         style = ttk.Style()
-                         style.configure(style_name, background=current_color)
-                         widget.configure(style=style_name)
-                    else:
-                         widget.configure(background=current_color)
-                except: pass # Ignore widgets that don't support background
-            self.blink_on = not self.blink_on
-            alert_window.after(500, blink) # Blink interval
-
-        # --- Content Frame ---
-        content_frame = ttk.Frame(alert_window, padding=50)
-        content_frame.place(relx=0.5, rely=0.5, anchor=tk.CENTER) # Center content
-
-        # Style for content frame needs to be dynamic for blinking
-        style_name = f"Blink.{content_frame.winfo_class()}"
-        style = ttk.Style()
-        style.configure(style_name, background="red") # Initial background
-        content_frame.configure(style=style_name)
-
-
-        # --- Alert Details ---
-        room = alert_data.get("room_number", "Unknown")
-        beacon_mac = alert_data.get("beacon_mac", "N/A")
-        description = alert_data.get("description", "")
-        timestamp_str = alert_data.get("timestamp", "")
-        try:
-            if timestamp_str:
-                # Handle timezone 'Z' and offsets for display
-                dt_str = timestamp_str
-                if dt_str.endswith('Z'):
-                     dt_str = dt_str[:-1] + '+00:00'
-                if '+' in dt_str or '-' in dt_str[10:]:
-                     dt = datetime.fromisoformat(dt_str)
-                else:
-                     dt = datetime.fromisoformat(dt_str).astimezone() # Assume local if naive
-
-                time_display = dt.strftime("%Y-%m-%d %H:%M:%S %Z") # Display timezone
-            else:
-                time_display = "No Timestamp"
-        except Exception as e:
-            print(f"Error formatting time for alert popup: {e}")
-            time_display = "Invalid Time"
-
-
-        # Configure label styles for blinking background
-        label_style_name = f"Blink.TLabel"
-        style.configure(label_style_name, background="red", foreground="white", anchor="center")
-
-        ttk.Label(content_frame, text="🚨 ATTENTION: ALARM! 🚨", font=("Arial", 48, "bold"), style=label_style_name).pack(pady=20)
-        ttk.Label(content_frame, text=f"ROOM: {room}", font=("Arial", 72, "bold"), style=label_style_name).pack(pady=10)
-        if description:
-             ttk.Label(content_frame, text=description, font=("Arial", 36), style=label_style_name).pack(pady=10)
-        ttk.Label(content_frame, text=f"Beacon: {beacon_mac}", font=("Arial", 24), style=label_style_name).pack(pady=5)
-        ttk.Label(content_frame, text=f"Time: {time_display}", font=("Arial", 18), style=label_style_name).pack(pady=5)
+        # --- Canvas Content ---
+        # Everything is drawn on one canvas so blinking only recolors a single rectangle item
+        screen_width = self._screen_w
+        screen_height = self._screen_h
+        canvas = tk.Canvas(alert_window, width=screen_width, height=screen_height,
+                           background="red", highlightthickness=0, bd=0)
+        canvas.pack(fill=tk.BOTH, expand=True)
+        bg_rect = canvas.create_rectangle(0, 0, screen_width, screen_height, fill="red", outline="")
+        canvas.tag_lower(bg_rect)
+
+        center_x = screen_width // 2
+        center_y = screen_height // 2
+        canvas.create_text(center_x, center_y - 260, text="🚨 ATTENTION: ALARM! 🚨",
+                           font=("Arial", 48, "bold"), fill="white", justify=tk.CENTER)
+        # Per-alarm text items, updated in place by show_alert_notification
+        self._alert_items = {
+            "bg": bg_rect,
+            "room": canvas.create_text(center_x, center_y - 140, font=("Arial", 72, "bold"),
+                                       fill="white", justify=tk.CENTER),
+            "desc": canvas.create_text(center_x, center_y - 40, font=("Arial", 36), fill="white",
+                                       justify=tk.CENTER, width=screen_width - 100),
+            "beacon": canvas.create_text(center_x, center_y + 30, font=("Arial", 24),
+                                         fill="white", justify=tk.CENTER),
+            "time": canvas.create_text(center_x, center_y + 80, font=("Arial", 18),
+                                       fill="white", justify=tk.CENTER),
+        }
 
         # --- Close Button ---
         close_button = tk.Button(
-            content_frame,
+            canvas,
             text="CLOSE ALARM (ESC)",
-            command=alert_window.destroy,
+            command=self.hide_alert_notification,
             font=("Arial", 20, "bold"),
             bg="white", fg="red",
             padx=30, pady=15, relief=tk.RAISED, bd=5
         )
-        close_button.pack(pady=40)
+        canvas.create_window(center_x, center_y + 180, window=close_button)
+
+        # Close button, Escape and the window manager close all just hide the window
+        alert_window.bind("<Escape>", lambda e: self.hide_alert_notification())
+        alert_window.protocol("WM_DELETE_WINDOW", self.hide_alert_notification)
+
+        self._alert_window = alert_window
+        self._alert_canvas = canvas
 
-        # Bind Escape key to close
-        alert_window.bind("<Escape>", lambda e: alert_window.destroy())
+    def show_alert_notification(self, alert_data):
+        """Show a fullscreen notification for a new alert"""
+        if self._alert_window is None or not self._alert_window.winfo_exists():
+            self._build_alert_window()
 
-        # Start blinking
-        blink()
+        # --- Alert Details ---
+        room = alert_data.get("room_number", "Unknown")
+        beacon_mac = alert_data.get("beacon_mac", "N/A")
+        description = alert_data.get("description", "")
+        if "_display_ts" not in alert_data:
+            index_alarm(alert_data) # Alarms from handle_aws_message are already indexed
+        time_display = alert_data["_display_ts"]
+
+        # The newest alarm replaces whatever the window was showing
+        canvas = self._alert_canvas
+        canvas.itemconfig(self._alert_items["room"], text=f"ROOM: {room}")
+        canvas.itemconfig(self._alert_items["desc"], text=description or "")
+        canvas.itemconfig(self._alert_items["beacon"], text=f"Beacon: {beacon_mac}")
+        canvas.itemconfig(self._alert_items["time"], text=f"Time: {time_display}")
+
+        alert_window = self._alert_window
+        alert_window.deiconify()
+        alert_window.attributes("-topmost", True)
+        alert_window.attributes("-fullscreen", True) # Make it fullscreen
+
+        # Start blinking unless a previous alarm already has it running
+        if self._alert_blink_after_id is None:
+            try:
+                self._alert_blink_ms = max(MIN_ALERT_BLINK_MS, int(self.settings.get("alert_blink_ms", 500)))
+            except (TypeError, ValueError):
+                self._alert_blink_ms = DEFAULT_SETTINGS["alert_blink_ms"]
+            self._alert_blink_on = True
+            self._blink_alert()
 
         # Optional: Auto-close after a timeout (e.g., 60 seconds)
-        # alert_window.after(60000, lambda: alert_window.destroy() if alert_window.winfo_exists() else None)
+        # alert_window.after(60000, self.hide_alert_notification)
 
         alert_window.focus_force() # Bring window to front
 
+    def _blink_alert(self):
+        """Toggle the alert background colour and schedule the next tick"""
+        self._alert_canvas.itemconfig(self._alert_items["bg"], fill="red" if self._alert_blink_on else "black")
+        self._alert_blink_on = not self._alert_blink_on
+        self._alert_blink_after_id = self._alert_window.after(self._alert_blink_ms, self._blink_alert)
+
+    def hide_alert_notification(self):
+        """Stop blinking and hide the alert window until the next alarm"""
+        if self._alert_blink_after_id is not None:
+            try:
+                self._alert_window.after_cancel(self._alert_blink_after_id)
+            except tk.TclError:
+                pass
+            self._alert_blink_after_id = None
+        if self._alert_window is not None and self._alert_window.winfo_exists():
+            self._alert_window.withdraw()
+
 
     # --- Beacon Mapping Handling (Loads from DB) ---
     def load_beacons_mapping(self):
         """Load beacon room mapping from the DATABASE for consistency"""
-        self.beacons_mapping = {}
+        self._mac_to_room = {}
+        self._mac_to_desc = {}
         try:
              all_db_beacons = self.db.get_all_beacons()
-             for beacon_row in all_db_beacons:
-                  # DB columns: id, mac_address, room_number, description, ...
-                  mac = beacon_row[1]
-                  room = beacon_row[2]
-                  desc = beacon_row[3]
-                  if mac:
-                       self.beacons_mapping[mac.upper()] = {"room_number": room, "description": desc or ""} # Store MACs uppercase
-             count = len(self.beacons_mapping)
+             # DB columns: id, mac_address, room_number, description, ... (MACs stored uppercase)
+             self._mac_to_room = {row[1].upper(): row[2] for row in all_db_beacons if row[1]}
+             self._mac_to_desc = {row[1].upper(): row[3] or "" for row in all_db_beacons if row[1]}
+             count = len(self._mac_to_room)
              print(f"Loaded {count} beacons mapping from database.")
              self.update_status_bar(f"Loaded mapping for {count} beacons from DB.")
              return True
@@ -1798,6 +2239,17 @@ class CombinedApp:
 
     # --- Admin UI Setup Methods (Adapted from admin.py's BeaconApp) ---
 
+    def create_text_panel(self, parent, **text_options):
+        """Create a tk.Text with a ttk vertical scrollbar, packed to fill parent"""
+        panel = ttk.Frame(parent)
+        panel.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        text = tk.Text(panel, **text_options)
+        vsb = ttk.Scrollbar(panel, orient=tk.VERTICAL, command=text.yview)
+        text.configure(yscrollcommand=vsb.set)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        return text
+
     def setup_admin_dashboard(self, parent_window):
         """Setup enhanced dashboard tab (now in its own window)"""
         dashboard_frame = ttk.Frame(parent_window, padding=10)
@@ -1885,9 +2337,9 @@ class CombinedApp:
         events_frame = ttk.LabelFrame(live_data_pane, text="Recent Raw Events (MQTT)")
         live_data_pane.add(events_frame, weight=2)
 
-        self.admin_recent_events = scrolledtext.ScrolledText(events_frame, height=10, wrap=tk.WORD, font=("Consolas", 9))
-        self.admin_recent_events.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.admin_recent_events = self.create_text_panel(events_frame, height=10, wrap=tk.WORD, font=("Consolas", 9))
         self.admin_recent_events.configure(state=tk.DISABLED)
+        self._admin_recent_events_text = None # Last rendered contents, to skip identical redraws
 
         # Context menu for events
         self.admin_recent_events_menu = tk.Menu(self.admin_recent_events, tearoff=0)
@@ -1900,8 +2352,11 @@ class CombinedApp:
         details_frame = ttk.LabelFrame(dashboard_pane, text="Selected Beacon Details")
         dashboard_pane.add(details_frame, weight=2)
 
-        self.admin_details_text = scrolledtext.ScrolledText(details_frame, height=8, wrap=tk.WORD, font=("Consolas", 10))
-        self.admin_details_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.admin_details_text = self.create_text_panel(details_frame, height=8, wrap=tk.WORD, font=("Consolas", 10))
+        # Configure tags once here rather than on every selection
+        self.admin_details_text.tag_configure('heading', font=("Consolas", 11, "bold"), underline=True)
+        self.admin_details_text.tag_configure('label', font=("Consolas", 10, "bold"))
+        self.admin_details_text.tag_configure('value', font=("Consolas", 10))
         self.admin_details_text.configure(state=tk.DISABLED)
         self.admin_active_tree.bind('<<TreeviewSelect>>', self.show_beacon_details_admin)
 
@@ -1981,8 +2436,7 @@ class CombinedApp:
          self.admin_active_beacons_var.set(str(active_count))
 
          # --- Update Recent Events (Example: last 10 MQTT messages from DB log) ---
-         self.admin_recent_events.configure(state=tk.NORMAL)
-         self.admin_recent_events.delete(1.0, tk.END)
+         event_lines = []
          recent_raw_logs = self.db.get_recent_logs(limit=20) # Get more logs
 
          event_count = 0
@@ -2033,13 +2487,20 @@ class CombinedApp:
                        print(f"Could not parse log details: {parse_err}")
 
 
-                   self.admin_recent_events.insert(tk.END, log_line + "\n")
+                   event_lines.append(log_line + "\n")
 
               if event_count >= 10: # Limit display to 10 MQTT events
                    break
 
-         self.admin_recent_events.yview(tk.END) # Scroll to bottom
-         self.admin_recent_events.configure(state=tk.DISABLED)
+         # Auto-refresh usually finds the same events; only touch the widget when they changed
+         events_text = "".join(event_lines)
+         if events_text != self._admin_recent_events_text:
+              self._admin_recent_events_text = events_text
+              self.admin_recent_events.configure(state=tk.NORMAL)
+              self.admin_recent_events.delete(1.0, tk.END)
+              self.admin_recent_events.insert(tk.END, events_text) # One insert for the whole panel
+              self.admin_recent_events.yview(tk.END) # Scroll to bottom
+              self.admin_recent_events.configure(state=tk.DISABLED)
 
 
 
@@ -2061,7 +2522,8 @@ class CombinedApp:
         if beacon_data:
             # DB columns: id, mac, room, desc, last_seen, rssi, battery, mode, aux_op, dist, charging, created
             field_names = ["ID", "MAC Address", "Room", "Description", "Last Seen", "RSSI", "Battery", "Mode", "Aux Op", "Est. Distance", "Charging", "Created"]
-            self.admin_details_text.insert(tk.END, f"--- Beacon Details ({selected_mac}) ---\n", ('heading',))
+            # Collect (text, tags) pairs and hand them to a single Text.insert call
+            parts = [f"--- Beacon Details ({selected_mac}) ---\n", ('heading',)]
             for i, field in enumerate(field_names):
                  value = beacon_data[i]
                  display_value = value
@@ -2076,13 +2538,10 @@ class CombinedApp:
                  elif field == "Battery" and value is not None: display_value = f"{value}%"
                  elif field == "Est. Distance" and value is not None: display_value = f"{value} m"
 
-                 self.admin_details_text.insert(tk.END, f"{field}: ", ('label',))
-                 self.admin_details_text.insert(tk.END, f"{display_value if display_value not in [None, ''] else 'N/A'}\n", ('value',))
+                 parts += (f"{field}: ", ('label',),
+                           f"{display_value if display_value not in [None, ''] else 'N/A'}\n", ('value',))
 
-             # Configure tags
-            self.admin_details_text.tag_configure('heading', font=("Consolas", 11, "bold"), underline=True)
-            self.admin_details_text.tag_configure('label', font=("Consolas", 10, "bold"))
-            self.admin_details_text.tag_configure('value', font=("Consolas", 10))
+            self.admin_details_text.insert(tk.END, *parts)
         else:
             self.admin_details_text.insert(tk.END, f"Could not retrieve details for beacon MAC: {selected_mac}")
 
@@ -2110,6 +2569,16 @@ class CombinedApp:
         # TRANSLATED from admin.py
         ttk.Button(io_frame, text="Export Room Map", command=self.export_room_mapping_admin).pack(side=tk.LEFT, padx=2)
         ttk.Button(io_frame, text="Import Room Map", command=self.import_room_mapping_admin).pack(side=tk.LEFT, padx=2)
+        self.admin_io_frame = io_frame
+
+        # --- Inline Import Prompt (packed below the I/O buttons only while an import is pending) ---
+        self._pending_room_map_import = None
+        self.admin_import_prompt = ttk.Frame(beacons_frame, padding=5, relief=tk.GROOVE)
+        self.admin_import_prompt_var = tk.StringVar()
+        ttk.Label(self.admin_import_prompt, textvariable=self.admin_import_prompt_var, wraplength=600).pack(side=tk.LEFT, padx=2)
+        ttk.Button(self.admin_import_prompt, text="Cancel", command=self.cancel_room_mapping_import_admin).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(self.admin_import_prompt, text="Merge", command=lambda: self.apply_room_mapping_import_admin(replace=False)).pack(side=tk.RIGHT, padx=2)
+        ttk.Button(self.admin_import_prompt, text="Replace All", command=lambda: self.apply_room_mapping_import_admin(replace=True)).pack(side=tk.RIGHT, padx=2)
 
         # --- Beacon List Treeview ---
         list_frame = ttk.Frame(beacons_frame)
@@ -2255,31 +2724,15 @@ class CombinedApp:
         aws_form_frame = ttk.Frame(aws_tab_frame)
         aws_form_frame.pack(fill=tk.BOTH, expand=True)
 
-        # Create variables linked to the main settings manager instance
-        self.admin_endpoint_var = tk.StringVar(value=self.settings.get("aws_endpoint"))
-        self.admin_cert_var = tk.StringVar(value=self.settings.get("cert_file"))
-        self.admin_key_var = tk.StringVar(value=self.settings.get("key_file"))
-        self.admin_root_ca_var = tk.StringVar(value=self.settings.get("root_ca"))
-        self.admin_client_id_var = tk.StringVar(value=self.settings.get("client_id"))
-        self.admin_topic_var = tk.StringVar(value=self.settings.get("topic"))
-        self.admin_alert_topic_var = tk.StringVar(value=self.settings.get("alert_topic"))
-
-        fields = [
-             ("Endpoint:", self.admin_endpoint_var, None),
-             ("Certificate File:", self.admin_cert_var, lambda: self.browse_file_admin("cert_file", self.admin_cert_var)),
-             ("Key File:", self.admin_key_var, lambda: self.browse_file_admin("key_file", self.admin_key_var)),
-             ("Root CA File:", self.admin_root_ca_var, lambda: self.browse_file_admin("root_ca", self.admin_root_ca_var)),
-             ("Client ID:", self.admin_client_id_var, None),
-             ("Subscribe Topic:", self.admin_topic_var, None),
-             ("Alert Topic:", self.admin_alert_topic_var, None),
-        ]
-
-        for i, (label_text, var, browse_cmd) in enumerate(fields):
+        # Variables linked to the main settings manager instance, keyed by setting name
+        self.admin_setting_vars = {}
+        for i, (label_text, key, browsable) in enumerate(AWS_SETTINGS_FIELDS):
+             var = self.admin_setting_vars[key] = tk.StringVar(value=self.settings.get(key))
              ttk.Label(aws_form_frame, text=label_text).grid(row=i, column=0, sticky=tk.W, padx=5, pady=5)
-             entry = ttk.Entry(aws_form_frame, textvariable=var, width=50)
-             entry.grid(row=i, column=1, sticky=tk.EW, padx=5, pady=5)
-             if browse_cmd:
-                  ttk.Button(aws_form_frame, text="Browse...", command=browse_cmd).grid(row=i, column=2, padx=5, pady=5)
+             ttk.Entry(aws_form_frame, textvariable=var, width=50).grid(row=i, column=1, sticky=tk.EW, padx=5, pady=5)
+             if browsable:
+                  ttk.Button(aws_form_frame, text="Browse...",
+                             command=lambda k=key, v=var: self.browse_file_admin(k, v)).grid(row=i, column=2, padx=5, pady=5)
 
         aws_form_frame.columnconfigure(1, weight=1) # Make entry fields expand
 
@@ -2545,7 +2998,7 @@ class CombinedApp:
             messagebox.showerror("Export Error", "Failed to export room map data.", parent=parent)
             return
 
-        default_filename = f"room_mapping_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        default_filename = f"room_mapping_{file_timestamp()}.json"
         filename = filedialog.asksaveasfilename(
             parent=parent,
             title="Export Room Map As",
@@ -2583,23 +3036,43 @@ class CombinedApp:
         if not filename: return
 
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                mapping_data = json.load(f)
+            with open(filename, 'rb') as f: # Read once as bytes; orjson parses them directly
+                mapping_data = json_loads(f.read())
 
             if "beacons" not in mapping_data or not isinstance(mapping_data["beacons"], list):
                 # TRANSLATED
                 messagebox.showerror("Import Error", "Invalid room map file format. Missing 'beacons' list.", parent=parent)
                 return
 
-            # TRANSLATED Confirmation Dialog
-            replace = messagebox.askyesno(
-                "Confirm Import Type",
-                "Do you want to replace all existing beacon mappings?\n\n"
-                "Click 'Yes' to clear current mappings before import.\n"
-                "Click 'No' to merge with existing mappings (updates existing, adds new).",
-                parent=parent
+            # Ask replace/merge inline in the beacons window instead of a modal dialog
+            self._pending_room_map_import = (filename, mapping_data)
+            self.admin_import_prompt_var.set(
+                f"Import {len(mapping_data['beacons'])} beacons from {os.path.basename(filename)}? "
+                "'Replace All' clears current mappings first; 'Merge' updates existing and adds new."
             )
+            self.admin_import_prompt.pack(fill=tk.X, padx=5, pady=5, after=self.admin_io_frame)
+
+        except json.JSONDecodeError:
+            # TRANSLATED
+            messagebox.showerror("Import Error", "Invalid JSON file format.", parent=parent)
+        except Exception as e:
+            # TRANSLATED
+            messagebox.showerror("Import Error", f"Error importing room map: {str(e)}", parent=parent)
+
+    def cancel_room_mapping_import_admin(self):
+        """Dismiss the inline import prompt without importing"""
+        self._pending_room_map_import = None
+        self.admin_import_prompt.pack_forget()
+
+    def apply_room_mapping_import_admin(self, replace):
+        """Import the room map chosen in import_room_mapping_admin (replace or merge)"""
+        pending = self._pending_room_map_import
+        self.cancel_room_mapping_import_admin()
+        if not pending: return
+        filename, mapping_data = pending
+        parent = self.admin_beacons_window if self.admin_beacons_window and self.admin_beacons_window.winfo_exists() else self.root
 
+        try:
             if replace:
                  if self.db.clear_all_beacons():
                       self.db.log_activity("ADMIN", "Cleared all beacons before import")
@@ -2623,9 +3096,6 @@ class CombinedApp:
                 # TRANSLATED
                 messagebox.showerror("Import Error", "Failed to import room map data. Check logs.", parent=parent)
 
-        except json.JSONDecodeError:
-            # TRANSLATED
-            messagebox.showerror("Import Error", "Invalid JSON file format.", parent=parent)
         except Exception as e:
             # TRANSLATED
             messagebox.showerror("Import Error", f"Error importing room map: {str(e)}", parent=parent)
@@ -2639,7 +3109,7 @@ class CombinedApp:
             title="Export Activity Logs As",
             defaultextension=".csv",
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-            initialfile=f"activity_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            initialfile=f"activity_log_{file_timestamp()}.csv"
         )
         if not filename: return
 
@@ -2672,32 +3142,26 @@ class CombinedApp:
     def save_settings_admin(self, parent_window):
         """Save settings from the admin settings form"""
         try:
-            # Update settings from admin form variables
-            self.settings.set("aws_endpoint", self.admin_endpoint_var.get())
-            self.settings.set("cert_file", self.admin_cert_var.get())
-            self.settings.set("key_file", self.admin_key_var.get())
-            self.settings.set("root_ca", self.admin_root_ca_var.get())
-            self.settings.set("client_id", self.admin_client_id_var.get())
-            self.settings.set("topic", self.admin_topic_var.get())
-            self.settings.set("alert_topic", self.admin_alert_topic_var.get())
+            # Collect settings from admin form variables; written to disk in one save below
+            new_values = {key: var.get() for key, var in self.admin_setting_vars.items()}
 
             # Save numeric values with validation
             try:
-                self.settings.set("alert_interval", int(self.admin_alert_interval_var.get()))
+                new_values["alert_interval"] = int(self.admin_alert_interval_var.get())
             except ValueError:
                  messagebox.showwarning("Input Error", "Invalid Alert Interval. Please enter a number.", parent=parent_window)
                  # Keep old value or default? Let's keep old.
                  self.admin_alert_interval_var.set(str(self.settings.get("alert_interval"))) # Revert display
 
             try:
-                 self.settings.set("scan_interval", int(self.admin_scan_interval_var.get()))
+                 new_values["scan_interval"] = int(self.admin_scan_interval_var.get())
             except ValueError:
                  messagebox.showwarning("Input Error", "Invalid Scan Interval. Please enter a number.", parent=parent_window)
                  self.admin_scan_interval_var.set(str(self.settings.get("scan_interval"))) # Revert display
 
 
-            # SettingsManager saves automatically on set, but call save again to be sure
-            if self.settings.save_settings():
+            if self.settings.update(new_values):
+                self._update_alert_topic_prefix() # Alert topic may have changed
                 messagebox.showinfo("Success", "Settings saved successfully.", parent=parent_window)
                 self.db.log_activity("ADMIN", "Settings updated")
                 self.update_status_bar("Settings saved.")
@@ -2934,23 +3398,23 @@ class CombinedApp:
 
     def show_about(self):
         """Show about dialog"""
-        messagebox.showinfo(
-            "About Beacon System",
-            f"{APP_TITLE} - Version {APP_VERSION}\n\n"
-            "Combined application for managing LoRa beacons via AWS IoT and viewing alerts.\n\n"
-            "Features:\n"
-            "- Real-time alert display (based on closest mapped beacon)\n"
-            "- Alarm history view, search, and export\n"
-            "- Admin section (requires login):\n"
-            "  - Live dashboard with active beacons\n"
-            "  - Beacon registration and management\n"
-            "  - Room map import/export (using database)\n"
-            "  - Detailed activity logs\n"
-            "  - AWS & Application settings\n"
-            "  - Admin password management (resets on close)\n\n"
-            f"(c) {datetime.now().year}",
-            parent=self.root
-        )
+        if self._about_text is None: # The text never changes, so build it only once
+            self._about_text = (
+                f"{APP_TITLE} - Version {APP_VERSION}\n\n"
+                "Combined application for managing LoRa beacons via AWS IoT and viewing alerts.\n\n"
+                "Features:\n"
+                "- Real-time alert display (based on closest mapped beacon)\n"
+                "- Alarm history view, search, and export\n"
+                "- Admin section (requires login):\n"
+                "  - Live dashboard with active beacons\n"
+                "  - Beacon registration and management\n"
+                "  - Room map import/export (using database)\n"
+                "  - Detailed activity logs\n"
+                "  - AWS & Application settings\n"
+                "  - Admin password management (resets on close)\n\n"
+                f"(c) {datetime.now().year}"
+            )
+        messagebox.showinfo("About Beacon System", self._about_text, parent=self.root)
 
     def on_exit(self):
         """Clean up resources before exiting"""
@@ -2971,6 +3435,10 @@ class CombinedApp:
         # Close database connection
         if hasattr(self, 'db'):
             self.db.close()
+
+        # Flush pending alarm history writes and close the file
+        self._history_write_q.put(("stop", None))
+        self._history_writer.join(timeout=2)
         
         # Destroy the root window
         self.root.destroy()
@@ -1,10 +1,15 @@
 import winreg
 import os
 import sys
-import subprocess
-import time
 import logging
-from datetime import datetime
+import functools
+
+# Per-user autostart locations shared by add/remove
+RUN_KEY = r"Software\Microsoft\Windows\CurrentVersion\Run"
+STARTUP_FOLDER = os.path.join(
+    os.getenv('APPDATA', ''),
+    'Microsoft\\Windows\\Start Menu\\Programs\\Startup'
+)
 
 # Set up logging
 log_dir = os.path.join(os.path.expanduser("~"), "AppData", "Local", "HotelBeacons", "logs")
@@ -15,11 +20,12 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(log_file),
+        logging.FileHandler(log_file, delay=True), # File is only opened once something is logged
         logging.StreamHandler()
     ]
 )
 
+@functools.lru_cache(maxsize=1) # The location cannot change while the script runs
 def get_main_app_path():
     """Get the absolute path to the main application executable"""
     if getattr(sys, 'frozen', False):
@@ -33,62 +39,70 @@ def get_main_app_path():
     main_app_path = os.path.join(current_dir, "HotelBeacons.exe")
     return os.path.abspath(main_app_path)
 
-def add_to_startup():
+def create_shortcut(shortcut_path, target_path):
+    """Create a .lnk shortcut to target_path (COM in-process, PowerShell as fallback)"""
+    working_dir = os.path.dirname(target_path)
+    # pywin32 is imported here, not at module level, so --remove never loads it
+    try:
+        from win32com.client import Dispatch
+    except ImportError:
+        Dispatch = None # pywin32 not installed, use PowerShell
+    if Dispatch is not None:
+        try:
+            shell = Dispatch('WScript.Shell')
+            shortcut = shell.CreateShortcut(shortcut_path)
+            shortcut.TargetPath = target_path
+            shortcut.WorkingDirectory = working_dir
+            shortcut.Save()
+            return
+        except Exception as e:
+            logging.warning(f"Creating shortcut via COM failed, falling back to PowerShell: {str(e)}")
+
+    # Use PowerShell to create the shortcut
+    import subprocess # Only needed on this fallback path
+    ps_command = f'''
+    $WshShell = New-Object -comObject WScript.Shell
+    $Shortcut = $WshShell.CreateShortcut("{shortcut_path}")
+    $Shortcut.TargetPath = "{target_path}"
+    $Shortcut.WorkingDirectory = "{working_dir}"
+    $Shortcut.Save()
+    '''
+    subprocess.run(['powershell', '-Command', ps_command], capture_output=True)
+
+def add_to_startup(test_launch=False):
+    """Register the app to run at logon; test_launch=True also starts it once to check it runs"""
     try:
         # Get the path to the main application
         main_app_path = get_main_app_path()
         logging.info(f"Main application path: {main_app_path}")
         
-        # Create the registry key
-        key = winreg.OpenKey(
-            winreg.HKEY_CURRENT_USER,
-            r"Software\Microsoft\Windows\CurrentVersion\Run",
-            0,
-            winreg.KEY_SET_VALUE
-        )
-        
-        # Set the value with the full path
-        winreg.SetValueEx(
-            key,
-            "HotelBeacons",
-            0,
-            winreg.REG_SZ,
-            f'"{main_app_path}"'
-        )
-        
-        # Close the key
-        winreg.CloseKey(key)
+        # Set the Run value with the full path (key is closed even if the write fails)
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, RUN_KEY, 0, winreg.KEY_SET_VALUE) as key:
+            winreg.SetValueEx(
+                key,
+                "HotelBeacons",
+                0,
+                winreg.REG_SZ,
+                f'"{main_app_path}"'
+            )
         logging.info("Added to Windows Registry successfully")
         
-        # Also add to the Startup folder as a backup method
-        startup_folder = os.path.join(
-            os.getenv('APPDATA'),
-            'Microsoft\\Windows\\Start Menu\\Programs\\Startup'
-        )
-        
-        # Create a shortcut in the startup folder
-        shortcut_path = os.path.join(startup_folder, "HotelBeacons.lnk")
+        # Also add a shortcut to the Startup folder as a backup method
+        shortcut_path = os.path.join(STARTUP_FOLDER, "HotelBeacons.lnk")
         
-        # Use PowerShell to create the shortcut
-        ps_command = f'''
-        $WshShell = New-Object -comObject WScript.Shell
-        $Shortcut = $WshShell.CreateShortcut("{shortcut_path}")
-        $Shortcut.TargetPath = "{main_app_path}"
-        $Shortcut.WorkingDirectory = "{os.path.dirname(main_app_path)}"
-        $Shortcut.Save()
-        '''
-        
-        subprocess.run(['powershell', '-Command', ps_command], capture_output=True)
+        create_shortcut(shortcut_path, main_app_path)
         logging.info("Added to Startup folder successfully")
         
-        # Test if we can launch the application
-        try:
-            subprocess.Popen([main_app_path], 
-                           creationflags=subprocess.CREATE_NEW_CONSOLE,
-                           cwd=os.path.dirname(main_app_path))
-            logging.info("Successfully launched the application for testing")
-        except Exception as e:
-            logging.error(f"Failed to launch application: {str(e)}")
+        # Optionally test if we can launch the application (--test-launch)
+        if test_launch:
+            import subprocess # Only needed for the optional test launch
+            try:
+                subprocess.Popen([main_app_path], 
+                               creationflags=subprocess.CREATE_NEW_CONSOLE,
+                               cwd=os.path.dirname(main_app_path))
+                logging.info("Successfully launched the application for testing")
+            except Exception as e:
+                logging.error(f"Failed to launch application: {str(e)}")
         
         print("Added to Windows startup successfully!")
         return True
@@ -101,28 +115,16 @@ def add_to_startup():
 def remove_from_startup():
     try:
         # Remove from Registry
-        key = winreg.OpenKey(
-            winreg.HKEY_CURRENT_USER,
-            r"Software\Microsoft\Windows\CurrentVersion\Run",
-            0,
-            winreg.KEY_SET_VALUE
-        )
-        
-        try:
-            winreg.DeleteValue(key, "HotelBeacons")
-            logging.info("Removed from Windows Registry successfully")
-        except WindowsError:
-            logging.info("No registry entry found to remove")
-            pass  # Value might not exist
-        
-        winreg.CloseKey(key)
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, RUN_KEY, 0, winreg.KEY_SET_VALUE) as key:
+            try:
+                winreg.DeleteValue(key, "HotelBeacons")
+                logging.info("Removed from Windows Registry successfully")
+            except WindowsError:
+                logging.info("No registry entry found to remove")
+                pass  # Value might not exist
         
         # Remove from Startup folder
-        startup_folder = os.path.join(
-            os.getenv('APPDATA'),
-            'Microsoft\\Windows\\Start Menu\\Programs\\Startup'
-        )
-        shortcut_path = os.path.join(startup_folder, "HotelBeacons.lnk")
+        shortcut_path = os.path.join(STARTUP_FOLDER, "HotelBeacons.lnk")
         
         if os.path.exists(shortcut_path):
             os.remove(shortcut_path)
@@ -141,5 +143,5 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--remove":
         remove_from_startup()
     else:
-        add_to_startup()
+        add_to_startup(test_launch="--test-launch" in sys.argv)
     logging.info("Startup script completed") 
\ No newline at end of file